@@ -4,10 +4,18 @@
 # ============================================================================
 
 from abc import ABC, abstractmethod
+from contextlib import nullcontext
 from datetime import datetime, timedelta
-from typing import Optional, List, Dict
+from functools import partial
+from typing import (
+    Any, Callable, ContextManager, Optional, List, Dict, Set, Tuple,
+    TypedDict, Union, cast
+)
+import re
 import sqlite3
-from dataclasses import dataclass
+import sys
+import threading
+from dataclasses import dataclass, fields, replace
 from enum import Enum
 
 
@@ -18,6 +26,8 @@ from enum import Enum
 class TimeProvider(ABC):
     """Abstracción del tiempo - permite tests determinísticos"""
     
+    __slots__ = ()
+    
     @abstractmethod
     def now(self) -> datetime:
         pass
@@ -26,6 +36,8 @@ class TimeProvider(ABC):
 class RealTimeProvider(TimeProvider):
     """Implementación real para producción"""
     
+    __slots__ = ()
+    
     def now(self) -> datetime:
         return datetime.now()
 
@@ -33,56 +45,95 @@ class RealTimeProvider(TimeProvider):
 class FakeTimeProvider(TimeProvider):
     """Implementación falsa para tests - tiempo controlable"""
     
+    __slots__ = ('_time',)
+    
     def __init__(self, fixed_time: datetime):
         self._time = fixed_time
     
     def now(self) -> datetime:
         return self._time
     
-    def advance(self, hours: int = 0, days: int = 0):
+    def advance(self, hours: int = 0, days: int = 0) -> None:
         """Avanzar el tiempo manualmente"""
         self._time += timedelta(hours=hours, days=days)
 
 
+# Cuerpo de email: texto ya generado o función que lo genera bajo demanda
+EmailBody = Union[str, Callable[[], str]]
+
+
+class EmailMessage(TypedDict):
+    """Mensaje en cola o en lote: solo el cuerpo puede ser diferido"""
+    to: str
+    subject: str
+    body: EmailBody
+
+
+def render_body(body: EmailBody) -> str:
+    """Materializar un cuerpo de email diferido"""
+    return body if isinstance(body, str) else body()
+
+
 class EmailService(ABC):
     """Abstracción del envío de emails"""
     
     @abstractmethod
-    def send(self, to: str, subject: str, body: str) -> bool:
+    def send(self, to: str, subject: str, body: EmailBody) -> bool:
         pass
+    
+    def send_batch(self, messages: List[EmailMessage]) -> List[bool]:
+        """Enviar varios mensajes {'to', 'subject', 'body'} de una vez"""
+        return [self.send(m['to'], m['subject'], m['body']) for m in messages]
 
 
 class SmtpEmailService(EmailService):
     """Implementación real con SMTP"""
     
-    def send(self, to: str, subject: str, body: str) -> bool:
+    def send(self, to: str, subject: str, body: EmailBody) -> bool:
         # Implementación real (comentada para evitar envíos)
         # import smtplib
         # smtp = smtplib.SMTP('smtp.gmail.com', 587)
-        # smtp.sendmail('auto@service.com', to, f"Subject: {subject}\n\n{body}")
+        # smtp.sendmail('auto@service.com', to,
+        #               f"Subject: {subject}\n\n{render_body(body)}")
         print(f"📧 Email enviado a {to}: {subject}")
         return True
+    
+    def send_batch(self, messages: List[EmailMessage]) -> List[bool]:
+        # Una sola sesión SMTP para todo el lote (comentada para evitar envíos)
+        # import smtplib
+        # smtp = smtplib.SMTP('smtp.gmail.com', 587)
+        # for m in messages:
+        #     smtp.sendmail('auto@service.com', m['to'],
+        #                   f"Subject: {m['subject']}\n\n{render_body(m['body'])}")
+        # smtp.quit()
+        for m in messages:
+            print(f"📧 Email enviado a {m['to']}: {m['subject']}")
+        return [True] * len(messages)
 
 
 class MockEmailService(EmailService):
     """Mock para tests - captura emails sin enviarlos"""
     
-    def __init__(self):
-        self.sent_emails: List[Dict[str, str]] = []
+    def __init__(self, store_bodies: bool = False):
+        self.sent_emails: List[Dict[str, Optional[str]]] = []
         self.call_count = 0
+        self.store_bodies = store_bodies  # False: no retener cuerpos en memoria
+        self._recipients: Set[str] = set()
     
-    def send(self, to: str, subject: str, body: str) -> bool:
+    def send(self, to: str, subject: str, body: EmailBody) -> bool:
         self.call_count += 1
         self.sent_emails.append({
             'to': to,
             'subject': subject,
-            'body': body
+            # Un cuerpo diferido solo se genera si se va a guardar
+            'body': render_body(body) if self.store_bodies else None
         })
+        self._recipients.add(to)
         return True
     
     def was_sent_to(self, email: str) -> bool:
         """Helper para verificar si se envió email a dirección"""
-        return any(e['to'] == email for e in self.sent_emails)
+        return email in self._recipients
 
 
 class SpyEmailService(EmailService):
@@ -90,13 +141,23 @@ class SpyEmailService(EmailService):
     
     def __init__(self, real_service: EmailService):
         self.real_service = real_service
-        self.sent_emails: List[Dict[str, str]] = []
+        self.sent_emails: List[EmailMessage] = []
         self.call_count = 0
     
-    def send(self, to: str, subject: str, body: str) -> bool:
+    def send(self, to: str, subject: str, body: EmailBody) -> bool:
         self.call_count += 1
+        body = render_body(body)
         self.sent_emails.append({'to': to, 'subject': subject, 'body': body})
         return self.real_service.send(to, subject, body)
+    
+    def send_batch(self, messages: List[EmailMessage]) -> List[bool]:
+        self.call_count += len(messages)
+        rendered: List[EmailMessage] = [
+            {'to': m['to'], 'subject': m['subject'], 'body': render_body(m['body'])}
+            for m in messages
+        ]
+        self.sent_emails.extend(rendered)
+        return self.real_service.send_batch(rendered)
 
 
 class NotificationService(ABC):
@@ -110,40 +171,58 @@ class NotificationService(ABC):
 class SpyNotificationService(NotificationService):
     """Spy que captura todas las llamadas al sistema de notificaciones"""
     
-    def __init__(self):
+    def __init__(self, time_provider: Optional[TimeProvider] = None):
+        self.time = time_provider or RealTimeProvider()
         self.notifications: List[Dict] = []
-        self.call_count = 0
-        self.call_args: List[tuple] = []
+        # Índices para consultas O(1) desde los tests
+        self._by_user: Dict[str, List[Dict]] = {}
+        self._user_channels: Set[Tuple[str, str]] = set()
+    
+    @property
+    def call_count(self) -> int:
+        """Número de llamadas a notify"""
+        return len(self.notifications)
+    
+    @property
+    def call_args(self) -> List[tuple]:
+        """Argumentos de cada llamada, derivados de notifications"""
+        return [
+            (n['user_id'], n['message'], n['channel'])
+            for n in self.notifications
+        ]
     
     def notify(self, user_id: str, message: str, channel: str) -> bool:
-        self.call_count += 1
-        self.call_args.append((user_id, message, channel))
-        self.notifications.append({
+        notification = {
             'user_id': user_id,
             'message': message,
             'channel': channel,
-            'timestamp': datetime.now()
-        })
+            'timestamp': self.time.now()
+        }
+        self.notifications.append(notification)
+        self._by_user.setdefault(user_id, []).append(notification)
+        self._user_channels.add((user_id, channel))
         return True
     
-    def was_notified(self, user_id: str, channel: str = None) -> bool:
+    def was_notified(self, user_id: str, channel: Optional[str] = None) -> bool:
         """Verificar si usuario fue notificado"""
-        for notif in self.notifications:
-            if notif['user_id'] == user_id:
-                if channel is None or notif['channel'] == channel:
-                    return True
-        return False
+        if channel is None:
+            return user_id in self._by_user
+        return (user_id, channel) in self._user_channels
     
     def get_notifications_for(self, user_id: str) -> List[Dict]:
         """Obtener todas las notificaciones de un usuario"""
-        return [n for n in self.notifications if n['user_id'] == user_id]
+        return list(self._by_user.get(user_id, ()))
 
 
 # ============================================================================
 # PARTE 2: REPOSITORIOS
 # ============================================================================
 
-@dataclass
+# __slots__ en entidades (dataclass(slots=True) existe desde Python 3.10)
+_SLOTS = {'slots': True} if sys.version_info >= (3, 10) else {}
+
+
+@dataclass(**_SLOTS)
 class Appointment:
     """Entidad de dominio"""
     id: Optional[int]
@@ -151,11 +230,31 @@ class Appointment:
     email: str
     service_type: str
     date: str
-    created_at: datetime
+    created_at: Union[str, datetime]  # ISO crudo al leer de la BD
     status: str = 'pending'
+    
+    @property
+    def created_at_dt(self) -> datetime:
+        """created_at como datetime - se parsea bajo demanda"""
+        if isinstance(self.created_at, datetime):
+            return self.created_at
+        return datetime.fromisoformat(self.created_at)
+    
+    def _compare_key(self) -> tuple:
+        """Valores de todos los campos, con created_at como instante"""
+        return tuple(
+            self.created_at_dt if f.name == 'created_at' else getattr(self, f.name)
+            for f in fields(self)
+        )
+    
+    def __eq__(self, other):
+        # ISO crudo (leído de la BD) == el datetime del que salió
+        if other.__class__ is not self.__class__:
+            return NotImplemented
+        return self._compare_key() == other._compare_key()
 
 
-@dataclass
+@dataclass(**_SLOTS)
 class Invoice:
     """Entidad de factura"""
     id: Optional[int]
@@ -169,9 +268,22 @@ class AppointmentRepository(ABC):
     """Repositorio de citas"""
     
     @abstractmethod
-    def create(self, appointment: Appointment) -> int:
+    def create(self, appointment: Appointment) -> Appointment:
+        """Persistir y devolver la cita con su id asignado"""
         pass
     
+    def create_many(self, appointments: List[Appointment]) -> List[int]:
+        """Persistir varias citas; las implementaciones pueden agruparlas"""
+        # create() siempre devuelve la cita con id asignado
+        return [
+            cast(int, self.create(appointment).id) for appointment in appointments
+        ]
+    
+    def insert_many(self, rows: List[tuple]) -> List[int]:
+        """Persistir filas (client_name, email, service_type, date, created_at
+        [, status]); sin status la cita queda 'pending'"""
+        return self.create_many([Appointment(None, *row) for row in rows])
+    
     @abstractmethod
     def find_by_id(self, id: int) -> Optional[Appointment]:
         pass
@@ -185,116 +297,211 @@ class AppointmentRepository(ABC):
         pass
 
 
-class SqliteAppointmentRepository(AppointmentRepository):
-    """Implementación SQLite del repositorio"""
+# DDL completo en un único script: un solo pase del parser y un commit
+_SCHEMA_SQL = """
+    CREATE TABLE IF NOT EXISTS clients (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        name TEXT NOT NULL,
+        email TEXT UNIQUE NOT NULL
+    );
+    
+    CREATE TABLE IF NOT EXISTS appointments (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        client_name TEXT NOT NULL,
+        email TEXT NOT NULL,
+        service_type TEXT NOT NULL,
+        date TEXT NOT NULL,
+        created_at TEXT NOT NULL,
+        status TEXT DEFAULT 'pending',
+        FOREIGN KEY (email) REFERENCES clients(email)
+    );
+    
+    CREATE TABLE IF NOT EXISTS invoices (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        appointment_id INTEGER NOT NULL,
+        amount REAL NOT NULL,
+        status TEXT DEFAULT 'unpaid',
+        created_at TEXT NOT NULL,
+        FOREIGN KEY (appointment_id) REFERENCES appointments(id)
+    );
+    
+    CREATE INDEX IF NOT EXISTS idx_invoices_apt ON invoices(appointment_id);
+"""
+
+# Las mismas sentencias por separado, para ejecutarlas sin executescript
+_SCHEMA_STATEMENTS = tuple(
+    statement for statement in _SCHEMA_SQL.split(';') if statement.strip()
+)
+
+
+# BD en archivo (producción): WAL + fsync agrupado, sin perder durabilidad
+_DURABLE_PRAGMAS = """
+    PRAGMA journal_mode=WAL;
+    PRAGMA synchronous=NORMAL;
+    PRAGMA temp_store=MEMORY;
+    PRAGMA cache_size=-20000;
+    PRAGMA busy_timeout=5000;
+"""
+
+# ':memory:' o durable=False (tests): sin fsync, journal ni locks por commit
+_FAST_PRAGMAS = """
+    PRAGMA synchronous=OFF;
+    PRAGMA journal_mode=MEMORY;
+    PRAGMA locking_mode=EXCLUSIVE;
+    PRAGMA temp_store=MEMORY;
+    PRAGMA cache_size=-8000;
+"""
+
+
+class SqliteRepository:
+    """Base SQLite - una única conexión reutilizada por el repositorio"""
     
-    def __init__(self, db_path: str):
-        self.db_path = db_path
+    def __init__(
+        self,
+        db_path: Union[str, sqlite3.Connection],
+        durable: bool = True
+    ):
+        if isinstance(db_path, sqlite3.Connection):
+            # Conexión compartida: la configura y la cierra quien la creó
+            self.db_path = None
+            self.conn = db_path
+            self._owns_conn = False
+        else:
+            self.db_path = db_path
+            self.conn = sqlite3.connect(
+                db_path, check_same_thread=False, cached_statements=256
+            )
+            self._owns_conn = True
+            self._configure_connection(durable)
+        # check_same_thread=False: serializar las escrituras que leen el rowid
+        self._write_lock = threading.Lock()
         self._init_schema()
     
-    def _init_schema(self):
+    def _configure_connection(self, durable: bool) -> None:
+        """PRAGMAs de rendimiento - una sola vez por conexión"""
+        if durable and self.db_path != ':memory:':
+            self.conn.executescript(_DURABLE_PRAGMAS)
+        else:
+            self.conn.executescript(_FAST_PRAGMAS)
+    
+    def _init_schema(self) -> None:
         """Crear tablas si no existen"""
-        conn = sqlite3.connect(self.db_path)
-        conn.execute("""
-            CREATE TABLE IF NOT EXISTS clients (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                name TEXT NOT NULL,
-                email TEXT UNIQUE NOT NULL
-            )
-        """)
-        conn.execute("""
-            CREATE TABLE IF NOT EXISTS appointments (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                client_name TEXT NOT NULL,
-                email TEXT NOT NULL,
-                service_type TEXT NOT NULL,
-                date TEXT NOT NULL,
-                created_at TEXT NOT NULL,
-                status TEXT DEFAULT 'pending',
-                FOREIGN KEY (email) REFERENCES clients(email)
-            )
-        """)
-        conn.execute("""
-            CREATE TABLE IF NOT EXISTS invoices (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                appointment_id INTEGER NOT NULL,
-                amount REAL NOT NULL,
-                status TEXT DEFAULT 'unpaid',
-                created_at TEXT NOT NULL,
-                FOREIGN KEY (appointment_id) REFERENCES appointments(id)
+        if self.conn.in_transaction:
+            # executescript haría COMMIT de la transacción de quien la abrió
+            for statement in _SCHEMA_STATEMENTS:
+                self.conn.execute(statement)
+        else:
+            self.conn.executescript(_SCHEMA_SQL)
+    
+    def _commit(self) -> None:
+        """Confirmar solo en conexiones propias; la prestada la controla su dueño"""
+        if self._owns_conn:
+            self.conn.commit()
+    
+    def _transaction(self) -> ContextManager[Any]:
+        """Transacción con commit/rollback propio, o nada si la conexión es prestada"""
+        return self.conn if self._owns_conn else nullcontext()
+    
+    def close(self) -> None:
+        """Cerrar la conexión del repositorio (solo si es propia)"""
+        if self._owns_conn:
+            self.conn.close()
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+def _isoformat(value: Union[str, datetime]) -> str:
+    """ISO 8601 sin re-formatear valores que ya vienen como texto"""
+    return value if isinstance(value, str) else value.isoformat()
+
+
+def _appointment_params(appointment: Appointment) -> tuple:
+    """Parámetros de INSERT en el orden de _SQL_INSERT"""
+    return (
+        appointment.client_name,
+        appointment.email,
+        appointment.service_type,
+        appointment.date,
+        _isoformat(appointment.created_at),
+        appointment.status
+    )
+
+
+def _row_to_appointment(row: tuple) -> Appointment:
+    """Fila en el orden de _COLUMNS -> Appointment (created_at sin parsear)"""
+    return Appointment(
+        row[0], row[1], row[2], row[3], row[4], row[5], row[6]
+    )
+
+
+class SqliteAppointmentRepository(SqliteRepository, AppointmentRepository):
+    """Implementación SQLite del repositorio"""
+    
+    # SQL constante: el cache de sentencias de sqlite3 reutiliza el plan
+    _SQL_INSERT = """
+        INSERT INTO appointments 
+        (client_name, email, service_type, date, created_at, status)
+        VALUES (?, ?, ?, ?, ?, ?)
+    """
+    _COLUMNS = "id, client_name, email, service_type, date, created_at, status"
+    _SQL_FIND_BY_ID = f"SELECT {_COLUMNS} FROM appointments WHERE id = ?"
+    # id es alias del rowid: el orden sale del B-tree, sin paso de ordenación
+    _SQL_FIND_ALL = f"SELECT {_COLUMNS} FROM appointments ORDER BY id"
+    _SQL_DELETE = "DELETE FROM appointments WHERE id = ?"
+    
+    def create(self, appointment: Appointment) -> Appointment:
+        with self._write_lock:
+            cursor = self.conn.execute(
+                self._SQL_INSERT, _appointment_params(appointment)
             )
-        """)
-        conn.commit()
-        conn.close()
+            self._commit()
+        return replace(appointment, id=cursor.lastrowid)
+    
+    def create_many(self, appointments: List[Appointment]) -> List[int]:
+        """Insertar varias citas con executemany en una única transacción"""
+        return self._execute_many(list(map(_appointment_params, appointments)))
+    
+    def insert_many(self, rows: List[tuple]) -> List[int]:
+        """Insertar filas como las de AppointmentRepository.insert_many,
+        sin crear entidades"""
+        # created_at (campo 4) con el mismo formato ISO que create/create_many;
+        # status opcional con el mismo valor por defecto que Appointment
+        return self._execute_many([
+            (*row[:4], _isoformat(row[4]), *(row[5:] or ('pending',)))
+            for row in rows
+        ])
     
-    def create(self, appointment: Appointment) -> int:
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        cursor.execute("""
-            INSERT INTO appointments 
-            (client_name, email, service_type, date, created_at, status)
-            VALUES (?, ?, ?, ?, ?, ?)
-        """, (
-            appointment.client_name,
-            appointment.email,
-            appointment.service_type,
-            appointment.date,
-            appointment.created_at.isoformat(),
-            appointment.status
-        ))
-        appointment_id = cursor.lastrowid
-        conn.commit()
-        conn.close()
-        return appointment_id
+    def _execute_many(self, rows: List[tuple]) -> List[int]:
+        """executemany en una única transacción; devuelve los ids asignados"""
+        if not rows:
+            return []
+        with self._write_lock, self._transaction():
+            self.conn.executemany(self._SQL_INSERT, rows)
+            last_id = self.conn.execute("SELECT last_insert_rowid()").fetchone()[0]
+        # AUTOINCREMENT es monótono dentro de una misma transacción
+        first_id = last_id - len(rows) + 1
+        return list(range(first_id, last_id + 1))
     
     def find_by_id(self, id: int) -> Optional[Appointment]:
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        cursor.execute(
-            "SELECT * FROM appointments WHERE id = ?", (id,)
-        )
-        row = cursor.fetchone()
-        conn.close()
+        row = self.conn.execute(self._SQL_FIND_BY_ID, (id,)).fetchone()
         
         if row:
-            return Appointment(
-                id=row[0],
-                client_name=row[1],
-                email=row[2],
-                service_type=row[3],
-                date=row[4],
-                created_at=datetime.fromisoformat(row[5]),
-                status=row[6]
-            )
+            return _row_to_appointment(row)
         return None
     
     def find_all(self) -> List[Appointment]:
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        cursor.execute("SELECT * FROM appointments")
-        rows = cursor.fetchall()
-        conn.close()
-        
-        return [
-            Appointment(
-                id=row[0],
-                client_name=row[1],
-                email=row[2],
-                service_type=row[3],
-                date=row[4],
-                created_at=datetime.fromisoformat(row[5]),
-                status=row[6]
-            )
-            for row in rows
-        ]
+        return list(map(
+            _row_to_appointment, self.conn.execute(self._SQL_FIND_ALL)
+        ))
     
     def delete(self, id: int) -> bool:
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        cursor.execute("DELETE FROM appointments WHERE id = ?", (id,))
+        cursor = self.conn.execute(self._SQL_DELETE, (id,))
         deleted = cursor.rowcount > 0
-        conn.commit()
-        conn.close()
+        self._commit()
         return deleted
 
 
@@ -302,7 +509,8 @@ class InvoiceRepository(ABC):
     """Repositorio de facturas"""
     
     @abstractmethod
-    def create(self, invoice: Invoice) -> int:
+    def create(self, invoice: Invoice) -> Invoice:
+        """Persistir y devolver la factura con su id asignado"""
         pass
     
     @abstractmethod
@@ -310,48 +518,59 @@ class InvoiceRepository(ABC):
         pass
 
 
-class SqliteInvoiceRepository(InvoiceRepository):
+def _invoice_params(invoice: Invoice) -> tuple:
+    """Parámetros de INSERT en el orden de _SQL_INSERT"""
+    return (
+        invoice.appointment_id,
+        invoice.amount,
+        invoice.status,
+        invoice.created_at.isoformat()
+    )
+
+
+def _row_to_invoice(row: tuple) -> Invoice:
+    """Fila de _SQL_FIND_BY_APPOINTMENT -> Invoice"""
+    return Invoice(
+        row[0], row[1], row[2], row[3], datetime.fromisoformat(row[4])
+    )
+
+
+class SqliteInvoiceRepository(SqliteRepository, InvoiceRepository):
     """Implementación SQLite para facturas"""
     
-    def __init__(self, db_path: str):
-        self.db_path = db_path
-    
-    def create(self, invoice: Invoice) -> int:
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        cursor.execute("""
-            INSERT INTO invoices 
-            (appointment_id, amount, status, created_at)
-            VALUES (?, ?, ?, ?)
-        """, (
-            invoice.appointment_id,
-            invoice.amount,
-            invoice.status,
-            invoice.created_at.isoformat()
-        ))
-        invoice_id = cursor.lastrowid
-        conn.commit()
-        conn.close()
-        return invoice_id
+    _SQL_INSERT = """
+        INSERT INTO invoices 
+        (appointment_id, amount, status, created_at)
+        VALUES (?, ?, ?, ?)
+    """
+    _SQL_FIND_BY_APPOINTMENT = """
+        SELECT id, appointment_id, amount, status, created_at
+        FROM invoices WHERE appointment_id = ?
+    """
+    
+    def create(self, invoice: Invoice) -> Invoice:
+        with self._write_lock:
+            cursor = self.conn.execute(self._SQL_INSERT, _invoice_params(invoice))
+            self._commit()
+        return replace(invoice, id=cursor.lastrowid)
+    
+    def create_many(self, invoices: List[Invoice]) -> List[int]:
+        """Insertar varias facturas con executemany en una única transacción"""
+        if not invoices:
+            return []
+        with self._write_lock, self._transaction():
+            self.conn.executemany(self._SQL_INSERT, map(_invoice_params, invoices))
+            last_id = self.conn.execute("SELECT last_insert_rowid()").fetchone()[0]
+        first_id = last_id - len(invoices) + 1
+        return list(range(first_id, last_id + 1))
     
     def find_by_appointment(self, appointment_id: int) -> Optional[Invoice]:
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        cursor.execute(
-            "SELECT * FROM invoices WHERE appointment_id = ?", 
-            (appointment_id,)
-        )
-        row = cursor.fetchone()
-        conn.close()
+        row = self.conn.execute(
+            self._SQL_FIND_BY_APPOINTMENT, (appointment_id,)
+        ).fetchone()
         
         if row:
-            return Invoice(
-                id=row[0],
-                appointment_id=row[1],
-                amount=row[2],
-                status=row[3],
-                created_at=datetime.fromisoformat(row[4])
-            )
+            return _row_to_invoice(row)
         return None
 
 
@@ -367,6 +586,39 @@ class ServiceType(Enum):
     FULL_SERVICE = "full_service"
 
 
+# Precalculados una vez al importar el módulo
+_VALID_SERVICE_TYPES_TUPLE = tuple(s.value for s in ServiceType)
+_VALID_SERVICE_TYPES = frozenset(_VALID_SERVICE_TYPES_TUPLE)
+
+_EMAIL_RE = re.compile(r"[^@\s]+@[^@\s]+\.[^@\s]+")
+_email_fullmatch = _EMAIL_RE.fullmatch  # fullmatch: '$' aceptaría un '\n' final
+
+_EMAIL_TMPL = """
+Estimado/a {client_name},
+
+Su cita de {service_type} ha sido confirmada para el {date}.
+
+Detalles:
+- Servicio: {service_type}
+- Fecha: {date}
+- Estado: {status}
+
+Gracias por confiar en AutoService.
+"""
+
+
+def _flush_pending(
+    email_service: EmailService,
+    pending: List[EmailMessage]
+) -> List[bool]:
+    """Vaciar una cola de emails con una sola llamada a send_batch"""
+    if not pending:
+        return []
+    messages = pending[:]
+    pending.clear()
+    return email_service.send_batch(messages)
+
+
 class AutoServiceManager:
     """Gestor principal - 100% testeable con inyección de dependencias"""
     
@@ -381,26 +633,21 @@ class AutoServiceManager:
         self.email = email_service
         self.repo = appointment_repo
         self.notifications = notification_service
+        # Emails diferidos, se envían juntos con flush_emails()
+        self.pending_emails: List[EmailMessage] = []
     
     def create_appointment(
         self,
         client_name: str,
         email: str,
         service_type: str,
-        date_str: str
+        date_str: str,
+        defer: bool = False
     ) -> Dict:
         """Crear cita con validaciones y notificaciones"""
         
-        # Validar tipo de servicio
-        if not self._validate_service_type(service_type):
-            raise ValueError(
-                f"Servicio inválido: {service_type}. "
-                f"Válidos: {[s.value for s in ServiceType]}"
-            )
-        
-        # Validar email
-        if not self._validate_email(email):
-            raise ValueError(f"Email inválido: {email}")
+        # Validar tipo de servicio y email
+        self._check_input(service_type, email)
         
         # Crear entidad
         created_at = self.time.now()
@@ -415,55 +662,135 @@ class AutoServiceManager:
         )
         
         # Persistir
-        appointment_id = self.repo.create(appointment)
-        appointment.id = appointment_id
+        appointment = self.repo.create(appointment)
         
-        # Enviar email
-        email_sent = self.email.send(
-            to=email,
-            subject="Cita Confirmada - AutoService",
-            body=self._create_email_body(appointment)
-        )
+        # Enviar email (o diferirlo hasta flush_emails)
+        message = self._confirmation_message(appointment)
+        if defer:
+            self.pending_emails.append(message)
+            email_sent = False
+        else:
+            email_sent = self.email.send(**message)
         
         # Notificar si hay servicio de notificaciones
         if self.notifications:
-            self.notifications.notify(
-                user_id=email,
-                message=f"Cita confirmada para {date_str}",
-                channel="email"
-            )
+            self._notify_confirmed(self.notifications, appointment)
         
         return {
-            'id': appointment_id,
+            'id': appointment.id,
             'status': 'confirmed',
             'email_sent': email_sent,
             'created_at': created_at,
             'appointment': appointment
         }
     
+    def create_appointments_bulk(
+        self,
+        items: List[Tuple[str, str, str, str]]
+    ) -> List[Dict]:
+        """Crear varias citas (nombre, email, servicio, fecha) en un solo commit"""
+        
+        # Validar todo antes de tocar la BD: un error no deja citas a medias
+        for _, email, service_type, _ in items:
+            self._check_input(service_type, email)
+        
+        created_at = self.time.now()
+        appointments = [
+            Appointment(None, client_name, email, service_type, date_str,
+                        created_at, 'confirmed')
+            for client_name, email, service_type, date_str in items
+        ]
+        
+        # Persistir en una única transacción
+        ids = self.repo.create_many(appointments)
+        appointments = [
+            replace(apt, id=apt_id) for apt, apt_id in zip(appointments, ids)
+        ]
+        
+        # Un solo lote de emails
+        emails_sent = self.email.send_batch(
+            [self._confirmation_message(apt) for apt in appointments]
+        )
+        
+        if self.notifications:
+            for apt in appointments:
+                self._notify_confirmed(self.notifications, apt)
+        
+        return [
+            {
+                'id': apt.id,
+                'status': 'confirmed',
+                'email_sent': email_sent,
+                'created_at': created_at,
+                'appointment': apt
+            }
+            for apt, email_sent in zip(appointments, emails_sent)
+        ]
+    
+    def flush_emails(self) -> List[bool]:
+        """Enviar todos los emails diferidos en un único lote"""
+        return _flush_pending(self.email, self.pending_emails)
+    
+    def _check_input(self, service_type: str, email: str) -> None:
+        """Lanzar ValueError si el servicio o el email no son válidos"""
+        if not self._validate_service_type(service_type):
+            raise ValueError(
+                f"Servicio inválido: {service_type}. "
+                f"Válidos: {list(_VALID_SERVICE_TYPES_TUPLE)}"
+            )
+        
+        if not self._validate_email(email):
+            raise ValueError(f"Email inválido: {email}")
+    
+    def _confirmation_message(
+        self,
+        appointment: Appointment
+    ) -> EmailMessage:
+        """Email de confirmación de una cita (cuerpo generado bajo demanda)"""
+        return {
+            'to': appointment.email,
+            'subject': "Cita Confirmada - AutoService",
+            'body': partial(self._create_email_body, appointment)
+        }
+    
+    def _notify_confirmed(
+        self,
+        notifications: NotificationService,
+        appointment: Appointment
+    ) -> None:
+        """Notificar la confirmación de una cita"""
+        notifications.notify(
+            user_id=appointment.email,
+            message=f"Cita confirmada para {appointment.date}",
+            channel="email"
+        )
+    
     def _validate_service_type(self, service_type: str) -> bool:
         """Validar que el tipo de servicio sea válido"""
-        valid_types = [s.value for s in ServiceType]
-        return service_type in valid_types
+        return service_type in _VALID_SERVICE_TYPES
     
     def _validate_email(self, email: str) -> bool:
         """Validación básica de email"""
-        return '@' in email and '.' in email.split('@')[1]
+        return _email_fullmatch(email) is not None
     
     def _create_email_body(self, appointment: Appointment) -> str:
         """Generar cuerpo del email"""
-        return f"""
-Estimado/a {appointment.client_name},
+        return _EMAIL_TMPL.format(
+            client_name=appointment.client_name,
+            service_type=appointment.service_type,
+            date=appointment.date,
+            status=appointment.status
+        )
 
-Su cita de {appointment.service_type} ha sido confirmada para el {appointment.date}.
 
-Detalles:
-- Servicio: {appointment.service_type}
-- Fecha: {appointment.date}
-- Estado: {appointment.status}
-
-Gracias por confiar en AutoService.
-"""
+_PRICES = {
+    'oil_change': 50.0,
+    'brake_check': 75.0,
+    'tire_rotation': 40.0,
+    'full_service': 150.0
+}
+_DEFAULT_PRICE = 100.0
+_price_lookup = _PRICES.get  # método ligado: evita resolver .get por llamada
 
 
 class BillingManager:
@@ -473,18 +800,22 @@ class BillingManager:
         self,
         time_provider: TimeProvider,
         invoice_repo: InvoiceRepository,
-        email_service: EmailService
+        email_service: EmailService,
+        pending_emails: Optional[List[EmailMessage]] = None
     ):
         # ✅ Inyección de dependencias aplicada
         self.time = time_provider
         self.invoice_repo = invoice_repo
         self.email = email_service
+        # Cola de emails diferidos; puede compartirse con AutoServiceManager
+        self.pending_emails = pending_emails if pending_emails is not None else []
     
     def create_invoice(
         self,
         appointment_id: int,
         client_email: str,
-        service_type: str
+        service_type: str,
+        defer: bool = False
     ) -> Dict:
         """Crear factura con precio según tipo de servicio"""
         
@@ -501,96 +832,163 @@ class BillingManager:
         )
         
         # Persistir
-        invoice_id = self.invoice_repo.create(invoice)
+        invoice = self.invoice_repo.create(invoice)
         
-        # Enviar factura por email
-        email_sent = self.email.send(
-            to=client_email,
-            subject=f"Factura #{invoice_id} - AutoService",
-            body=f"Monto a pagar: ${amount:.2f}"
-        )
+        # Enviar factura por email (o diferirla hasta flush_emails)
+        message: EmailMessage = {
+            'to': client_email,
+            'subject': f"Factura #{invoice.id} - AutoService",
+            'body': f"Monto a pagar: ${amount:.2f}"
+        }
+        if defer:
+            self.pending_emails.append(message)
+            email_sent = False
+        else:
+            email_sent = self.email.send(**message)
         
         return {
-            'invoice_id': invoice_id,
+            'invoice_id': invoice.id,
             'amount': amount,
-            'email_sent': email_sent
+            'email_sent': email_sent,
+            'invoice': invoice
         }
     
+    def flush_emails(self) -> List[bool]:
+        """Enviar todos los emails diferidos en un único lote"""
+        return _flush_pending(self.email, self.pending_emails)
+    
     def _calculate_amount(self, service_type: str) -> float:
         """Calcular precio según tipo de servicio"""
-        prices = {
-            'oil_change': 50.0,
-            'brake_check': 75.0,
-            'tire_rotation': 40.0,
-            'full_service': 150.0
-        }
-        return prices.get(service_type, 100.0)
+        return _price_lookup(service_type, _DEFAULT_PRICE)
 
 
 # ============================================================================
 # PARTE 4: TESTS COMPLETOS - EJERCICIOS RESUELTOS
 # ============================================================================
 
+import logging
+from dataclasses import astuple
+
 import pytest
 
+# Mensajes de progreso de los tests; visibles con --log-level=DEBUG
+log = logging.getLogger("tests")
+
 
 # FIXTURES
+_SHARED_DB_URI = "file:autoservice_tests?mode=memory&cache=shared"
+
+_RESET_SQL = """
+DELETE FROM invoices;
+DELETE FROM appointments;
+DELETE FROM clients;
+DELETE FROM sqlite_sequence;
+"""
+
+
+@pytest.fixture(scope="module")
+def shared_memory_db():
+    """BD en memoria con caché compartida: el schema se crea una sola vez"""
+    # Mientras esta conexión siga abierta la BD en memoria no se destruye
+    holder = sqlite3.connect(_SHARED_DB_URI, uri=True)
+    holder.executescript(_SCHEMA_SQL)
+    
+    yield holder
+    
+    holder.close()
+
+
 @pytest.fixture
-def db_connection():
+def db_connection(shared_memory_db):
     """BD en memoria con rollback automático - EJERCICIO 1"""
-    conn = sqlite3.connect(':memory:')
+    # Conexión ligera a la BD compartida: schema y páginas ya en caché
+    conn = sqlite3.connect(_SHARED_DB_URI, uri=True)
     
-    # Setup schema completo
-    conn.execute("""
-        CREATE TABLE clients (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            name TEXT NOT NULL,
-            email TEXT UNIQUE NOT NULL
-        )
-    """)
-    
-    conn.execute("""
-        CREATE TABLE appointments (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            client_name TEXT NOT NULL,
-            email TEXT NOT NULL,
-            service_type TEXT NOT NULL,
-            date TEXT NOT NULL,
-            created_at TEXT NOT NULL,
-            status TEXT DEFAULT 'pending',
-            FOREIGN KEY (email) REFERENCES clients(email)
-        )
-    """)
-    
-    conn.execute("""
-        CREATE TABLE invoices (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            appointment_id INTEGER NOT NULL,
-            amount REAL NOT NULL,
-            status TEXT DEFAULT 'unpaid',
-            created_at TEXT NOT NULL,
-            FOREIGN KEY (appointment_id) REFERENCES appointments(id)
-        )
-    """)
+    yield conn
+    
+    # Teardown automático: descartar lo pendiente y vaciar lo confirmado
+    conn.rollback()
+    conn.executescript(_RESET_SQL)
+    conn.close()
+
+
+_DEFAULT_TIME = datetime(2025, 10, 2)
+
+
+@pytest.fixture
+def time_provider():
+    """FakeTimeProvider en la fecha por defecto de los tests"""
+    return FakeTimeProvider(_DEFAULT_TIME)
+
+
+@pytest.fixture
+def shared_connection():
+    """Una sola BD en memoria compartida por varios repositorios"""
+    conn = sqlite3.connect(':memory:')
+    conn.execute("PRAGMA foreign_keys = ON")
     
     yield conn
     
-    # Teardown automático
     conn.close()
 
 
+@pytest.fixture(scope="module")
+def sqlite_repo():
+    """Repositorio en memoria compartido por el módulo (schema una sola vez)"""
+    repo = SqliteAppointmentRepository(':memory:')
+    
+    yield repo
+    
+    repo.close()
+
+
 @pytest.fixture
-def test_manager():
+def clean_repo(sqlite_repo):
+    """Repositorio compartido, vaciado al terminar cada test"""
+    yield sqlite_repo
+    
+    sqlite_repo.conn.execute("DELETE FROM appointments")
+    sqlite_repo.conn.execute(
+        "DELETE FROM sqlite_sequence WHERE name = 'appointments'"
+    )
+    sqlite_repo.conn.commit()
+
+
+@pytest.fixture
+def invoice_repo():
+    """Repositorio de facturas en memoria, cerrado al terminar el test"""
+    with SqliteInvoiceRepository(':memory:') as repo:
+        yield repo
+
+
+@pytest.fixture
+def make_test_manager():
+    """create_test_manager_custom que cierra sus repositorios al terminar"""
+    repos = []
+    
+    def make(**kwargs):
+        created = create_test_manager_custom(**kwargs)
+        repos.append(created[0].repo)
+        return created
+    
+    yield make
+    
+    for repo in repos:
+        repo.close()
+
+
+@pytest.fixture
+def test_manager(clean_repo):
     """Manager con todas las dependencias mockeadas"""
     fixed_time = datetime(2025, 10, 2, 10, 0, 0)
+    time_provider = FakeTimeProvider(fixed_time)
     mock_email = MockEmailService()
-    spy_notifications = SpyNotificationService()
-    repo = SqliteAppointmentRepository(':memory:')
+    spy_notifications = SpyNotificationService(time_provider)
     
     manager = AutoServiceManager(
-        time_provider=FakeTimeProvider(fixed_time),
+        time_provider=time_provider,
         email_service=mock_email,
-        appointment_repo=repo,
+        appointment_repo=clean_repo,
         notification_service=spy_notifications
     )
     
@@ -643,7 +1041,7 @@ def test_insert_multiple_appointments_with_rollback(db_connection):
     # Simular rollback (en fixture real sería automático)
     db_connection.rollback()
     
-    print("✅ Test de BD transaccional pasó correctamente")
+    log.debug("✅ Test de BD transaccional pasó correctamente")
 
 
 def test_foreign_key_constraint_fails(db_connection):
@@ -669,18 +1067,76 @@ def test_foreign_key_constraint_fails(db_connection):
         ))
         db_connection.commit()
     
-    print("✅ FK constraint funciona correctamente")
+    log.debug("✅ FK constraint funciona correctamente")
 
 
-def test_complex_transaction_appointment_invoice_email():
+@pytest.mark.parametrize("service_type", ["oil_change", "brake_check"])
+def test_db_connection_isolated_between_cases(db_connection, service_type):
+    """Cada caso parte de la BD compartida vacía aunque el anterior confirmara"""
+    cursor = db_connection.cursor()
+    
+    cursor.execute("SELECT COUNT(*) FROM appointments")
+    assert cursor.fetchone()[0] == 0
+    
+    cursor.execute("""
+        INSERT INTO appointments 
+        (client_name, email, service_type, date, created_at, status)
+        VALUES (?, ?, ?, ?, ?, ?)
+    """, ("Ana", "ana@test.com", service_type, "2025-10-10",
+          _DEFAULT_TIME.isoformat(), "pending"))
+    db_connection.commit()
+    
+    # id reiniciado: sqlite_sequence también se vacía entre casos
+    assert cursor.lastrowid == 1
+    
+    log.debug("✅ BD aislada para %s", service_type)
+
+
+def test_borrowed_connection_keeps_open_transaction(shared_connection):
+    """Crear un repositorio no confirma la transacción abierta del llamador"""
+    shared_connection.executescript(_SCHEMA_SQL)
+    shared_connection.execute(
+        "INSERT INTO clients (name, email) VALUES (?, ?)",
+        ("Ana", "ana@test.com")
+    )
+    assert shared_connection.in_transaction
+    
+    repo = SqliteAppointmentRepository(shared_connection)
+    assert shared_connection.in_transaction
+    
+    # Las escrituras del repositorio tampoco confirman la transacción
+    apt = repo.create(Appointment(
+        None, "Ana", "ana@test.com", "oil_change", "2025-10-10",
+        _DEFAULT_TIME, "confirmed"
+    ))
+    repo.create_many([replace(apt, id=None, date="2025-10-11")])
+    repo.delete(apt.id)
+    assert shared_connection.in_transaction
+    
+    shared_connection.rollback()
+    for table in ("clients", "appointments"):
+        count = shared_connection.execute(
+            f"SELECT COUNT(*) FROM {table}"
+        ).fetchone()[0]
+        assert count == 0, table
+    
+    log.debug("✅ La conexión prestada conserva su transacción")
+
+
+def test_complex_transaction_appointment_invoice_email(shared_connection):
     """Transacción compleja: cita + factura + email en una operación"""
     # Setup
     fixed_time = datetime(2025, 10, 2, 14, 30, 0)
     time_provider = FakeTimeProvider(fixed_time)
     mock_email = MockEmailService()
     
-    appointment_repo = SqliteAppointmentRepository(':memory:')
-    invoice_repo = SqliteInvoiceRepository(':memory:')
+    # Ambos repositorios sobre la misma BD: las FK se validan de verdad
+    appointment_repo = SqliteAppointmentRepository(shared_connection)
+    invoice_repo = SqliteInvoiceRepository(shared_connection)
+    shared_connection.execute(
+        "INSERT INTO clients (name, email) VALUES (?, ?)",
+        ("María González", "maria@test.com")
+    )
     
     manager = AutoServiceManager(
         time_provider=time_provider,
@@ -688,10 +1144,12 @@ def test_complex_transaction_appointment_invoice_email():
         appointment_repo=appointment_repo
     )
     
+    # Ambos gestores comparten la cola de emails diferidos
     billing = BillingManager(
         time_provider=time_provider,
         invoice_repo=invoice_repo,
-        email_service=mock_email
+        email_service=mock_email,
+        pending_emails=manager.pending_emails
     )
     
     # Ejecutar transacción compleja
@@ -700,7 +1158,8 @@ def test_complex_transaction_appointment_invoice_email():
         client_name="María González",
         email="maria@test.com",
         service_type="full_service",
-        date_str="2025-10-15"
+        date_str="2025-10-15",
+        defer=True
     )
     
     appointment_id = result['id']
@@ -710,12 +1169,16 @@ def test_complex_transaction_appointment_invoice_email():
     invoice_result = billing.create_invoice(
         appointment_id=appointment_id,
         client_email="maria@test.com",
-        service_type="full_service"
+        service_type="full_service",
+        defer=True
     )
     
     assert invoice_result['amount'] == 150.0
+    assert len(mock_email.sent_emails) == 0  # Aún en cola
     
-    # 3. Verificar emails enviados
+    # 3. Enviar ambos emails en un único lote y verificarlos
+    assert manager.flush_emails() == [True, True]
+    assert manager.pending_emails == []
     assert len(mock_email.sent_emails) == 2  # Confirmación + Factura
     assert mock_email.was_sent_to("maria@test.com")
     
@@ -728,20 +1191,19 @@ def test_complex_transaction_appointment_invoice_email():
     assert saved_invoice is not None
     assert saved_invoice.amount == 150.0
     
-    print("✅ Transacción compleja ejecutada correctamente")
+    log.debug("✅ Transacción compleja ejecutada correctamente")
 
 
 # ============================================================================
 # EJERCICIO 2 RESUELTO: REFACTORING PARA TESTEABILIDAD
 # ============================================================================
 
-def test_billing_with_dependency_injection():
+def test_billing_with_dependency_injection(invoice_repo):
     """Validar que BillingManager es 100% testeable con DI"""
     # Setup con dependencias mockeadas
     fixed_time = datetime(2025, 10, 2, 16, 0, 0)
     time_provider = FakeTimeProvider(fixed_time)
     mock_email = MockEmailService()
-    invoice_repo = SqliteInvoiceRepository(':memory:')
     
     billing = BillingManager(
         time_provider=time_provider,
@@ -765,7 +1227,7 @@ def test_billing_with_dependency_injection():
     invoice = invoice_repo.find_by_appointment(1)
     assert invoice.created_at == fixed_time
     
-    print("✅ BillingManager es 100% testeable con DI")
+    log.debug("✅ BillingManager es 100% testeable con DI")
 
 
 def test_identify_testability_problems():
@@ -782,24 +1244,23 @@ def test_identify_testability_problems():
         print(problem)
     
     assert len(problems_solved) == 5
-    print("\n✅ 5 problemas de testeabilidad identificados y resueltos")
+    log.debug("✅ 5 problemas de testeabilidad identificados y resueltos")
 
 
 # ============================================================================
 # EJERCICIO 3 RESUELTO: TEST DOUBLES AVANZADOS
 # ============================================================================
 
-def test_spy_notification_service_captures_calls():
+def test_spy_notification_service_captures_calls(time_provider, clean_repo):
     """Spy captura todas las llamadas al sistema de notificaciones"""
     # Setup con Spy
     spy_notifications = SpyNotificationService()
     mock_email = MockEmailService()
-    repo = SqliteAppointmentRepository(':memory:')
     
     manager = AutoServiceManager(
-        time_provider=FakeTimeProvider(datetime(2025, 10, 2)),
+        time_provider=time_provider,
         email_service=mock_email,
-        appointment_repo=repo,
+        appointment_repo=clean_repo,
         notification_service=spy_notifications
     )
     
@@ -839,16 +1300,29 @@ def test_spy_notification_service_captures_calls():
     assert len(c1_notifications) == 1
     assert c1_notifications[0]['channel'] == "email"
     
-    print("✅ Spy capturó todas las llamadas correctamente")
+    log.debug("✅ Spy capturó todas las llamadas correctamente")
+
+
+def test_spy_notification_uses_injected_time():
+    """Spy registra el timestamp del TimeProvider inyectado"""
+    fixed_time = datetime(2025, 10, 2, 18, 45, 0)
+    spy_notifications = SpyNotificationService(FakeTimeProvider(fixed_time))
+    
+    spy_notifications.notify("c1@test.com", "Mensaje", "sms")
+    
+    assert spy_notifications.notifications[0]['timestamp'] == fixed_time
+    assert isinstance(SpyNotificationService().time, RealTimeProvider)
+    
+    log.debug("✅ Spy usa el tiempo inyectado")
 
 
-def test_mock_email_verifies_correct_data():
+def test_mock_email_verifies_correct_data(time_provider, clean_repo):
     """Mock verifica que email se envía con datos correctos"""
-    mock_email = MockEmailService()
+    mock_email = MockEmailService(store_bodies=True)
     manager = AutoServiceManager(
-        time_provider=FakeTimeProvider(datetime(2025, 10, 2)),
+        time_provider=time_provider,
         email_service=mock_email,
-        appointment_repo=SqliteAppointmentRepository(':memory:')
+        appointment_repo=clean_repo
     )
     
     # Crear cita
@@ -870,16 +1344,46 @@ def test_mock_email_verifies_correct_data():
     assert "2025-10-20" in email_sent['body']
     assert "Pedro Martínez" in email_sent['body']
     
-    print("✅ Mock verificó datos del email correctamente")
+    log.debug("✅ Mock verificó datos del email correctamente")
+
+
+def test_mock_email_discards_bodies_by_default():
+    """Mock no retiene cuerpos de email salvo que se pida"""
+    mock_email = MockEmailService()
+    mock_email.send("a@test.com", "Asunto", "Cuerpo largo")
+    
+    assert mock_email.sent_emails[0]['body'] is None
+    assert mock_email.was_sent_to("a@test.com")
+    
+    log.debug("✅ Mock descarta cuerpos por defecto")
+
+
+def test_email_body_rendered_only_when_stored():
+    """El cuerpo diferido no se genera si el Mock no lo guarda"""
+    rendered = []
+    
+    def body():
+        rendered.append(True)
+        return "Cuerpo"
+    
+    MockEmailService().send("a@test.com", "Asunto", body)
+    assert rendered == []
+    
+    mock_email = MockEmailService(store_bodies=True)
+    mock_email.send("a@test.com", "Asunto", body)
+    assert rendered == [True]
+    assert mock_email.sent_emails[0]['body'] == "Cuerpo"
+    
+    log.debug("✅ Cuerpo de email generado solo cuando se inspecciona")
 
 
-def test_fake_time_provider_controls_time():
+def test_fake_time_provider_controls_time(clean_repo):
     """Fake TimeProvider permite controlar tiempo en tests"""
     fake_time = FakeTimeProvider(datetime(2025, 1, 1, 8, 0, 0))
     manager = AutoServiceManager(
         time_provider=fake_time,
         email_service=MockEmailService(),
-        appointment_repo=SqliteAppointmentRepository(':memory:')
+        appointment_repo=clean_repo
     )
     
     # Crear primera cita
@@ -911,55 +1415,65 @@ def test_fake_time_provider_controls_time():
     
     assert (time3 - time2).days == 2
     
-    print("✅ Fake TimeProvider controla tiempo perfectamente")
+    log.debug("✅ Fake TimeProvider controla tiempo perfectamente")
 
 
 # ============================================================================
 # PARTE 5: TESTS ADICIONALES - CASOS EDGE Y COBERTURA COMPLETA
 # ============================================================================
 
-def test_appointment_validation_errors():
+@pytest.mark.parametrize("email,service_type,match", [
+    pytest.param("test@test.com", "invalid_service", "Servicio inválido",
+                 id="servicio-invalido"),
+    pytest.param("email-sin-arroba", "oil_change", "Email inválido",
+                 id="email-sin-arroba"),
+    pytest.param("test@", "oil_change", "Email inválido",
+                 id="email-sin-dominio"),
+])
+def test_appointment_validation_errors(test_manager, email, service_type, match):
     """Validar manejo de errores en validaciones"""
-    manager, _, _ = AutoServiceManager(
-        time_provider=FakeTimeProvider(datetime(2025, 10, 2)),
-        email_service=MockEmailService(),
-        appointment_repo=SqliteAppointmentRepository(':memory:')
-    ), MockEmailService(), None
+    manager, _, _ = test_manager
     
-    # Servicio inválido
-    with pytest.raises(ValueError, match="Servicio inválido"):
-        manager[0].create_appointment(
-            "Cliente", "test@test.com", "invalid_service", "2025-10-10"
+    with pytest.raises(ValueError, match=match):
+        manager.create_appointment(
+            "Cliente", email, service_type, "2025-10-10"
         )
     
-    # Email inválido
-    with pytest.raises(ValueError, match="Email inválido"):
-        manager[0].create_appointment(
-            "Cliente", "email-sin-arroba", "oil_change", "2025-10-10"
-        )
+    log.debug("✅ Validaciones de error funcionan correctamente")
+
+
+@pytest.mark.parametrize("email,valid", [
+    ("ana@test.com", True),
+    ("ana.lopez@mail.test.com", True),
+    ("email-sin-arroba", False),
+    ("test@", False),
+    ("@test.com", False),
+    ("ana@localhost", False),
+    ("ana lopez@test.com", False),
+    ("ana@@test.com", False),
+    ("ana@test.com\n", False),
+])
+def test_validate_email_edge_cases(test_manager, email, valid):
+    """Validación de email en casos límite"""
+    manager, _, _ = test_manager
     
-    # Email sin dominio
-    with pytest.raises(ValueError, match="Email inválido"):
-        manager[0].create_appointment(
-            "Cliente", "test@", "oil_change", "2025-10-10"
-        )
+    assert manager._validate_email(email) is valid
     
-    print("✅ Validaciones de error funcionan correctamente")
+    log.debug("✅ Validación de email en casos límite correcta")
 
 
-def test_find_all_appointments():
+@pytest.mark.parametrize("expected_count", [1, 5])
+def test_find_all_appointments(test_manager, expected_count):
     """Verificar búsqueda de todas las citas"""
-    manager, mock_email, _ = test_manager()
+    manager, mock_email, _ = test_manager
     
-    # Crear múltiples citas
-    expected_count = 5
-    for i in range(expected_count):
-        manager.create_appointment(
-            f"Cliente {i}",
-            f"cliente{i}@test.com",
-            "oil_change",
-            f"2025-10-{10+i}"
-        )
+    # Crear múltiples citas en un solo commit
+    results = manager.create_appointments_bulk([
+        (f"Cliente {i}", f"cliente{i}@test.com", "oil_change", f"2025-10-{10+i}")
+        for i in range(expected_count)
+    ])
+    assert [r['id'] for r in results] == list(range(1, expected_count + 1))
+    assert len(mock_email.sent_emails) == expected_count
     
     # Buscar todas
     all_appointments = manager.repo.find_all()
@@ -970,12 +1484,96 @@ def test_find_all_appointments():
         assert apt.id == i + 1
         assert apt.client_name == f"Cliente {i}"
     
-    print(f"✅ Encontradas {expected_count} citas correctamente")
+    log.debug("✅ Encontradas %s citas correctamente", expected_count)
+
+
+def test_create_from_threads_returns_own_ids(clean_repo):
+    """Cada hilo recibe el id de su propia fila (rowid leído bajo el lock)"""
+    created = []
+    
+    def worker(n: int):
+        for i in range(20):
+            apt = clean_repo.create(Appointment(
+                None, f"Hilo {n}-{i}", "hilo@test.com", "oil_change",
+                "2025-10-10", _DEFAULT_TIME, "confirmed"
+            ))
+            created.append(apt)
+    
+    threads = [threading.Thread(target=worker, args=(n,)) for n in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    
+    assert len({apt.id for apt in created}) == 80
+    for apt in created:
+        assert clean_repo.find_by_id(apt.id).client_name == apt.client_name
+    
+    log.debug("✅ Ids correctos con escrituras concurrentes")
+
+
+@pytest.mark.parametrize("row_count", [1, 5])
+def test_insert_many_rows(clean_repo, row_count):
+    """Filas generadas de una vez e insertadas con un único executemany"""
+    created_at = _DEFAULT_TIME.isoformat()
+    rows = [
+        (f"Cliente {i}", f"cliente{i}@test.com", "oil_change",
+         f"2025-10-{10+i}", created_at, "confirmed")
+        for i in range(row_count)
+    ]
+    
+    ids = clean_repo.insert_many(rows)
+    assert ids == list(range(1, row_count + 1))
+    
+    all_appointments = clean_repo.find_all()
+    assert len(all_appointments) == row_count
+    assert [apt.client_name for apt in all_appointments] == [r[0] for r in rows]
+    
+    # datetime se guarda igual que en create: ISO con 'T'
+    clean_repo.insert_many([
+        ("Cliente dt", "dt@test.com", "oil_change", "2025-10-20",
+         datetime(2025, 1, 1, 9, 30), "confirmed")
+    ])
+    assert clean_repo.find_all()[-1].created_at == "2025-01-01T09:30:00"
+    
+    log.debug("✅ %s filas insertadas en un solo lote", row_count)
+
+
+def test_insert_many_row_shape_matches_default(clean_repo):
+    """SQLite y la implementación por defecto aceptan las mismas filas"""
+    row = ("Sin estado", "sin@test.com", "oil_change", "2025-10-10",
+           _DEFAULT_TIME)
+    
+    sqlite_id, = clean_repo.insert_many([row])
+    default_id, = AppointmentRepository.insert_many(clean_repo, [row])
+    
+    sqlite_apt = clean_repo.find_by_id(sqlite_id)
+    default_apt = clean_repo.find_by_id(default_id)
+    assert sqlite_apt.status == default_apt.status == 'pending'
+    assert replace(sqlite_apt, id=default_id) == default_apt
+    
+    log.debug("✅ Mismo formato de fila en ambas implementaciones")
 
 
-def test_delete_appointment():
+def test_bulk_appointments_validate_before_persisting(test_manager):
+    """Un item inválido aborta el lote completo sin persistir nada"""
+    manager, mock_email, _ = test_manager
+    
+    with pytest.raises(ValueError, match="Email inválido"):
+        manager.create_appointments_bulk([
+            ("Cliente 1", "c1@test.com", "oil_change", "2025-10-10"),
+            ("Cliente 2", "email-sin-arroba", "oil_change", "2025-10-11"),
+        ])
+    
+    assert manager.repo.find_all() == []
+    assert mock_email.sent_emails == []
+    
+    log.debug("✅ Lote inválido no persiste citas")
+
+
+def test_delete_appointment(test_manager):
     """Verificar eliminación de citas"""
-    manager, _, _ = test_manager()
+    manager, _, _ = test_manager
     
     # Crear cita
     result = manager.create_appointment(
@@ -999,14 +1597,71 @@ def test_delete_appointment():
     deleted_again = manager.repo.delete(appointment_id)
     assert deleted_again is False
     
-    print("✅ Eliminación de citas funciona correctamente")
+    log.debug("✅ Eliminación de citas funciona correctamente")
 
 
-def test_invoice_status_unpaid_by_default():
+def test_create_many_appointments_in_single_transaction(
+    clean_repo, invoice_repo
+):
+    """Verificar inserción masiva de citas e IDs devueltos"""
+    repo = clean_repo
+    created_at = datetime(2025, 10, 2)
+    appointments = [
+        Appointment(None, f"Cliente {i}", f"c{i}@test.com", "oil_change",
+                    "2025-10-10", created_at, "confirmed")
+        for i in range(3)
+    ]
+    
+    ids = repo.create_many(appointments)
+    
+    assert ids == [1, 2, 3]
+    assert [a.client_name for a in repo.find_all()] == [
+        "Cliente 0", "Cliente 1", "Cliente 2"
+    ]
+    assert repo.create_many([]) == []
+    
+    invoice_ids = invoice_repo.create_many([
+        Invoice(None, apt_id, 50.0, 'unpaid', created_at) for apt_id in ids
+    ])
+    assert invoice_ids == [1, 2, 3]
+    assert invoice_repo.find_by_appointment(3).id == 3
+    
+    log.debug("✅ Inserción masiva en una transacción funciona")
+
+
+def test_find_by_id_parses_created_at_lazily(make_test_manager):
+    """created_at se conserva como ISO y se parsea solo al pedirlo"""
+    manager, _, _ = make_test_manager(
+        fixed_time=datetime(2025, 10, 2, 9, 30, 0)
+    )
+    result = manager.create_appointment(
+        "Cliente Lazy", "lazy@test.com", "oil_change", "2025-10-10"
+    )
+    
+    found = manager.repo.find_by_id(result['id'])
+    assert found.created_at == "2025-10-02T09:30:00"
+    assert found.created_at_dt == datetime(2025, 10, 2, 9, 30, 0)
+    
+    # Leer created_at_dt no cambia la entidad ni su igualdad
+    assert found.created_at == "2025-10-02T09:30:00"
+    assert found == manager.repo.find_by_id(result['id'])
+    assert found == result['appointment']
+    assert found != replace(found, status='cancelled')
+    
+    # Sin campos auxiliares: astuple/asdict solo ven los campos de la cita
+    assert astuple(found) == (
+        result['id'], "Cliente Lazy", "lazy@test.com", "oil_change",
+        "2025-10-10", "2025-10-02T09:30:00", "confirmed"
+    )
+    
+    log.debug("✅ created_at se parsea bajo demanda")
+
+
+def test_invoice_status_unpaid_by_default(time_provider, invoice_repo):
     """Verificar que facturas se crean como 'unpaid'"""
     billing = BillingManager(
-        time_provider=FakeTimeProvider(datetime(2025, 10, 2)),
-        invoice_repo=SqliteInvoiceRepository(':memory:'),
+        time_provider=time_provider,
+        invoice_repo=invoice_repo,
         email_service=MockEmailService()
     )
     
@@ -1016,42 +1671,41 @@ def test_invoice_status_unpaid_by_default():
         service_type="oil_change"
     )
     
-    invoice = billing.invoice_repo.find_by_appointment(1)
+    # La factura devuelta ya está completa: no hace falta releerla
+    invoice = result['invoice']
+    assert invoice.id == result['invoice_id']
     assert invoice.status == 'unpaid'
     
-    print("✅ Estado de factura es 'unpaid' por defecto")
+    log.debug("✅ Estado de factura es 'unpaid' por defecto")
 
 
-def test_service_type_enum_all_valid():
+@pytest.mark.parametrize("service_type", [
+    pytest.param(st, id=st.name) for st in ServiceType
+])
+def test_service_type_enum_all_valid(test_manager, service_type):
     """Verificar que todos los ServiceType son válidos"""
-    manager, _, _ = test_manager()
+    manager, _, _ = test_manager
     
-    # Probar todos los tipos válidos
-    for service_type in ServiceType:
-        result = manager.create_appointment(
-            f"Cliente {service_type.name}",
-            f"{service_type.value}@test.com",
-            service_type.value,
-            "2025-10-10"
-        )
-        assert result['status'] == 'confirmed'
+    result = manager.create_appointment(
+        f"Cliente {service_type.name}",
+        f"{service_type.value}@test.com",
+        service_type.value,
+        "2025-10-10"
+    )
+    assert result['status'] == 'confirmed'
     
-    print("✅ Todos los ServiceType son válidos")
+    log.debug("✅ Todos los ServiceType son válidos")
 
 
-def test_concurrent_appointments_same_time():
+@pytest.mark.parametrize("count", [2, 3])
+def test_concurrent_appointments_same_time(test_manager, count):
     """Simular múltiples citas al mismo tiempo"""
-    fixed_time = datetime(2025, 10, 2, 10, 0, 0)
-    time_provider = FakeTimeProvider(fixed_time)
-    manager = AutoServiceManager(
-        time_provider=time_provider,
-        email_service=MockEmailService(),
-        appointment_repo=SqliteAppointmentRepository(':memory:')
-    )
+    manager, _, _ = test_manager
+    fixed_time = manager.time.now()
     
-    # Crear 3 citas sin avanzar tiempo
+    # Crear varias citas sin avanzar tiempo
     results = []
-    for i in range(3):
+    for i in range(count):
         result = manager.create_appointment(
             f"Cliente {i}",
             f"c{i}@test.com",
@@ -1064,16 +1718,16 @@ def test_concurrent_appointments_same_time():
     timestamps = [r['created_at'] for r in results]
     assert all(t == fixed_time for t in timestamps)
     
-    print("✅ Citas concurrentes al mismo tiempo funcionan")
+    log.debug("✅ Citas concurrentes al mismo tiempo funcionan")
 
 
-def test_email_body_contains_all_details():
+def test_email_body_contains_all_details(time_provider, clean_repo):
     """Verificar que email contiene todos los detalles"""
-    mock_email = MockEmailService()
+    mock_email = MockEmailService(store_bodies=True)
     manager = AutoServiceManager(
-        time_provider=FakeTimeProvider(datetime(2025, 10, 2)),
+        time_provider=time_provider,
         email_service=mock_email,
-        appointment_repo=SqliteAppointmentRepository(':memory:')
+        appointment_repo=clean_repo
     )
     
     manager.create_appointment(
@@ -1092,25 +1746,27 @@ def test_email_body_contains_all_details():
     assert "2025-10-25" in body
     assert "confirmed" in body
     
-    print("✅ Email contiene todos los detalles correctamente")
+    log.debug("✅ Email contiene todos los detalles correctamente")
 
 
 # ============================================================================
 # PARTE 6: FACTORIES Y CONFIGURACIÓN
 # ============================================================================
 
-def create_production_manager() -> AutoServiceManager:
+def create_production_manager(
+    db_path: str = 'autoservice_prod.db'
+) -> AutoServiceManager:
     """Factory para ambiente de producción"""
     return AutoServiceManager(
         time_provider=RealTimeProvider(),
         email_service=SmtpEmailService(),
-        appointment_repo=SqliteAppointmentRepository('autoservice_prod.db'),
+        appointment_repo=SqliteAppointmentRepository(db_path),
         notification_service=None  # Agregar implementación real si existe
     )
 
 
 def create_test_manager_custom(
-    fixed_time: datetime = None,
+    fixed_time: Optional[datetime] = None,
     db_path: str = ':memory:',
     enable_notifications: bool = True
 ) -> tuple:
@@ -1118,11 +1774,14 @@ def create_test_manager_custom(
     if fixed_time is None:
         fixed_time = datetime(2025, 1, 1, 12, 0, 0)
     
+    time_provider = FakeTimeProvider(fixed_time)
     mock_email = MockEmailService()
-    spy_notifications = SpyNotificationService() if enable_notifications else None
+    spy_notifications = (
+        SpyNotificationService(time_provider) if enable_notifications else None
+    )
     
     manager = AutoServiceManager(
-        time_provider=FakeTimeProvider(fixed_time),
+        time_provider=time_provider,
         email_service=mock_email,
         appointment_repo=SqliteAppointmentRepository(db_path),
         notification_service=spy_notifications
@@ -1131,22 +1790,28 @@ def create_test_manager_custom(
     return manager, mock_email, spy_notifications
 
 
-def test_production_factory_creates_real_dependencies():
+def test_production_factory_creates_real_dependencies(tmp_path):
     """Verificar que factory de producción usa dependencias reales"""
-    manager = create_production_manager()
+    # BD temporal: el test no debe tocar la BD de producción versionada
+    manager = create_production_manager(str(tmp_path / "prod.db"))
     
-    assert isinstance(manager.time, RealTimeProvider)
-    assert isinstance(manager.email, SmtpEmailService)
-    assert isinstance(manager.repo, SqliteAppointmentRepository)
+    try:
+        assert isinstance(manager.time, RealTimeProvider)
+        assert isinstance(manager.email, SmtpEmailService)
+        assert isinstance(manager.repo, SqliteAppointmentRepository)
+    finally:
+        manager.repo.close()
     
-    print("✅ Factory de producción configura dependencias reales")
+    log.debug("✅ Factory de producción configura dependencias reales")
 
 
-def test_custom_factory_allows_configuration():
+@pytest.mark.parametrize("custom_time", [
+    pytest.param(_DEFAULT_TIME, id="default"),
+    pytest.param(datetime(2030, 12, 31, 23, 59, 59), id="end-of-decade"),
+])
+def test_custom_factory_allows_configuration(make_test_manager, custom_time):
     """Verificar que factory personalizable funciona"""
-    custom_time = datetime(2030, 12, 31, 23, 59, 59)
-    
-    manager, mock_email, spy_notif = create_test_manager_custom(
+    manager, mock_email, spy_notif = make_test_manager(
         fixed_time=custom_time,
         enable_notifications=False
     )
@@ -1155,7 +1820,7 @@ def test_custom_factory_allows_configuration():
     assert isinstance(mock_email, MockEmailService)
     assert spy_notif is None
     
-    print("✅ Factory personalizable permite configuración")
+    log.debug("✅ Factory personalizable permite configuración")
 
 
 # ============================================================================
@@ -1191,7 +1856,7 @@ def test_calculate_coverage_metrics():
     assert metrics['coverage'] >= 90.0
     assert metrics['code_coverage'] >= 90.0
     
-    print("✅ Cobertura objetivo alcanzada (>90%)")
+    log.debug("✅ Cobertura objetivo alcanzada (>90%)")
 
 
 # ============================================================================
@@ -1225,6 +1890,8 @@ def example_production_usage():
         print(f"❌ Error de validación: {e}")
     except Exception as e:
         print(f"❌ Error inesperado: {e}")
+    finally:
+        manager.repo.close()
     
     print("="*60)
 
@@ -1258,6 +1925,7 @@ def example_test_usage():
     # Avanzar tiempo
     manager.time.advance(hours=2)
     print(f"   Tiempo avanzado 2 horas: {manager.time.now()}")
+    manager.repo.close()
     
     print("="*60)
 
@@ -1,16 +1,31 @@
+# Datos iniciales de la conexión simulada
+SEED_USERS = (
+    {'id': 1, 'cedula': '1234567890', 'nombre': 'Juan Pérez'},
+    {'id': 2, 'cedula': '0987654321', 'nombre': 'María García'},
+    {'id': 3, 'cedula': '1122334455', 'nombre': 'Carlos Rodríguez'}
+)
+
+
 class MockConnection:
     """Simula una conexión a la base de datos"""
+    __slots__ = ('data', 'next_id', 'by_cedula')
+    
     def __init__(self):
-        self.data = [
-            {'id': 1, 'cedula': '1234567890', 'nombre': 'Juan Pérez'},
-            {'id': 2, 'cedula': '0987654321', 'nombre': 'María García'},
-            {'id': 3, 'cedula': '1122334455', 'nombre': 'Carlos Rodríguez'}
-        ]
-        self.next_id = 4
+        self.data = [dict(u) for u in SEED_USERS]
+        self.next_id = len(SEED_USERS) + 1
+        # Índice por cédula: búsquedas O(1) en SELECT/UPDATE/DELETE
+        self.by_cedula = {u['cedula']: u for u in self.data}
     
-    def cursor(self, dictionary=False):
-        """Retorna un cursor simulado"""
-        return MockCursor(self.data, self.next_id, dictionary)
+    def reset(self):
+        """Restaura los datos iniciales en sitio (para reutilizar la conexión)"""
+        self.data[:] = [dict(u) for u in SEED_USERS]
+        self.next_id = len(SEED_USERS) + 1
+        self.by_cedula.clear()
+        self.by_cedula.update((u['cedula'], u) for u in self.data)
+    
+    def cursor(self, dictionary=False, prepared=False, buffered=False):
+        """Retorna un cursor simulado (prepared/buffered se aceptan e ignoran)"""
+        return MockCursor(self, dictionary)
     
     def commit(self):
         """Simula commit de transacción"""
@@ -27,9 +42,17 @@ class MockConnection:
 
 class MockCursor:
     """Simula un cursor de base de datos"""
-    def __init__(self, data, next_id, dictionary=False):
-        self.data = data
-        self.next_id = next_id
+    __slots__ = (
+        'connection', 'data', 'by_cedula', 'dictionary',
+        'lastrowid', 'rowcount', 'result'
+    )
+    
+    def __init__(self, connection, dictionary=False):
+        # next_id se lee de la conexión: todos sus cursores comparten
+        # la secuencia y ven el reinicio de reset()
+        self.connection = connection
+        self.data = connection.data
+        self.by_cedula = connection.by_cedula
         self.dictionary = dictionary
         self.lastrowid = None
         self.rowcount = 0
@@ -37,58 +60,110 @@ class MockCursor:
     
     def execute(self, query, params=None):
         """Simula ejecución de query"""
-        query_lower = query.lower()
-        
-        if "insert" in query_lower:
-            # Simular INSERT
-            cedula, nombre = params
-            nuevo_usuario = {
-                'id': self.next_id,
-                'cedula': cedula,
-                'nombre': nombre
-            }
-            self.data.append(nuevo_usuario)
-            self.lastrowid = self.next_id
-            self.next_id += 1
-            self.rowcount = 1
-        
-        elif "select" in query_lower:
-            # Simular SELECT
-            if params:  # WHERE cedula = ?
-                cedula = params[0]
-                self.result = next((u for u in self.data if u['cedula'] == cedula), None)
-            else:  # SELECT ALL
-                self.result = self.data.copy()
-        
-        elif "update" in query_lower:
-            # Simular UPDATE
-            nuevo_nombre, cedula = params
-            for usuario in self.data:
-                if usuario['cedula'] == cedula:
-                    usuario['nombre'] = nuevo_nombre
-                    self.rowcount = 1
-                    return
+        # Despacho por el verbo SQL: un slice y una búsqueda en dict
+        handler = self._HANDLERS.get(query.lstrip()[:6].upper())
+        if handler:
+            handler(self, params)
+    
+    def executemany(self, query, seq_params):
+        """Simula ejecución de query para cada juego de parámetros"""
+        total = 0
+        for params in seq_params:
+            self.execute(query, params)
+            total += self.rowcount
+        self.rowcount = total
+    
+    def _insert(self, params):
+        """Simular INSERT"""
+        cedula, nombre = params
+        if cedula in self.by_cedula:  # cédula UNIQUE: no se inserta
+            self.lastrowid = None
+            self.rowcount = 0
+            return
+        connection = self.connection
+        nuevo_usuario = {
+            'id': connection.next_id,
+            'cedula': cedula,
+            'nombre': nombre
+        }
+        self.data.append(nuevo_usuario)
+        self.by_cedula[cedula] = nuevo_usuario
+        self.lastrowid = connection.next_id
+        connection.next_id += 1
+        self.rowcount = 1
+    
+    def _select(self, params):
+        """Simular SELECT"""
+        if params:  # WHERE cedula = ?
+            self.result = self.by_cedula.get(params[0])
+        else:  # SELECT ALL
+            self.result = self.data  # sin copia aquí: se copia en fetchall
+    
+    def _update(self, params):
+        """Simular UPDATE"""
+        nuevo_nombre, cedula = params
+        usuario = self.by_cedula.get(cedula)
+        if usuario is None:
             self.rowcount = 0
-        
-        elif "delete" in query_lower:
-            # Simular DELETE
-            cedula = params[0]
-            for i, usuario in enumerate(self.data):
-                if usuario['cedula'] == cedula:
-                    self.data.pop(i)
-                    self.rowcount = 1
-                    return
+            return
+        usuario['nombre'] = nuevo_nombre
+        self.rowcount = 1
+    
+    def _delete(self, params):
+        """Simular DELETE"""
+        usuario = self.by_cedula.pop(params[0], None)
+        if usuario is None:
             self.rowcount = 0
+            return
+        self.data.remove(usuario)
+        self.rowcount = 1
+    
+    _HANDLERS = {
+        'INSERT': _insert,
+        'SELECT': _select,
+        'UPDATE': _update,
+        'DELETE': _delete
+    }
     
     def fetchall(self):
-        """Retorna todos los resultados"""
-        return self.result if self.result else []
+        """Retorna una instantánea de los resultados"""
+        result = self.result
+        if not result:
+            return []
+        if isinstance(result, dict):  # SELECT filtrado: una sola fila
+            return [result]
+        return list(result)
     
     def fetchone(self):
-        """Retorna un resultado"""
-        return self.result
+        """Retorna un resultado (sin exponer la lista interna)"""
+        result = self.result
+        return list(result) if isinstance(result, list) else result
+
+
+class _MockConnectionPool:
+    """Pool de conexiones simuladas: se reinician en vez de recrearse"""
+    _free = []
+    
+    @classmethod
+    def acquire(cls):
+        return cls._free.pop() if cls._free else MockConnection()
+    
+    @classmethod
+    def release(cls, connection):
+        connection.reset()
+        cls._free.append(connection)
 
 
 def get_mock_connection():
     """Retorna una conexión simulada"""
-    return MockConnection()
\ No newline at end of file
+    return MockConnection()
+
+
+def acquire_mock_connection():
+    """Retorna una conexión simulada del pool (devolver con release)"""
+    return _MockConnectionPool.acquire()
+
+
+def release_mock_connection(connection):
+    """Devuelve una conexión al pool con sus datos iniciales restaurados"""
+    _MockConnectionPool.release(connection)
\ No newline at end of file
@@ -4,11 +4,20 @@ from mysql.connector import Error
 class UserModel:
     def __init__(self, db_connection):
         self.connection = db_connection
+        # Cursores persistentes. Un cursor preparado guarda solo su última
+        # sentencia: uno por sentencia para no volver a prepararla
+        self._cur_insert = db_connection.cursor(prepared=True)
+        self._cur_update = db_connection.cursor(prepared=True)
+        self._cur_delete = db_connection.cursor(prepared=True)
+        # Lecturas: diccionario con buffer (admite fetchone)
+        self._cur_dict = db_connection.cursor(dictionary=True, buffered=True)
+        # executemany solo agrupa los INSERT en un cursor no preparado
+        self._cur_batch = db_connection.cursor()
     
     def crear(self, cedula, nombre):
         """Inserta un nuevo usuario"""
         try:
-            cursor = self.connection.cursor()
+            cursor = self._cur_insert
             query = "INSERT INTO users (cedula, nombre) VALUES (%s, %s)"
             cursor.execute(query, (cedula, nombre))
             self.connection.commit()
@@ -17,10 +26,22 @@ class UserModel:
             print(f"✗ Error al crear usuario: {e}")
             return None
     
+    def crear_muchos(self, filas):
+        """Inserta varios usuarios (cedula, nombre) en una sola transacción"""
+        try:
+            cursor = self._cur_batch
+            query = "INSERT INTO users (cedula, nombre) VALUES (%s, %s)"
+            cursor.executemany(query, filas)
+            self.connection.commit()
+            return cursor.rowcount
+        except Error as e:
+            print(f"✗ Error al crear usuarios: {e}")
+            return 0
+    
     def listar_todos(self):
         """Obtiene todos los usuarios"""
         try:
-            cursor = self.connection.cursor(dictionary=True)
+            cursor = self._cur_dict
             cursor.execute("SELECT * FROM users")
             usuarios = cursor.fetchall()
             return usuarios
@@ -31,7 +52,7 @@ class UserModel:
     def buscar_por_cedula(self, cedula):
         """Busca un usuario por cédula"""
         try:
-            cursor = self.connection.cursor(dictionary=True)
+            cursor = self._cur_dict
             query = "SELECT * FROM users WHERE cedula = %s"
             cursor.execute(query, (cedula,))
             usuario = cursor.fetchone()
@@ -43,7 +64,7 @@ class UserModel:
     def actualizar(self, cedula, nuevo_nombre):
         """Actualiza el nombre de un usuario"""
         try:
-            cursor = self.connection.cursor()
+            cursor = self._cur_update
             query = "UPDATE users SET nombre = %s WHERE cedula = %s"
             cursor.execute(query, (nuevo_nombre, cedula))
             self.connection.commit()
@@ -55,7 +76,7 @@ class UserModel:
     def eliminar(self, cedula):
         """Elimina un usuario por cédula"""
         try:
-            cursor = self.connection.cursor()
+            cursor = self._cur_delete
             query = "DELETE FROM users WHERE cedula = %s"
             cursor.execute(query, (cedula,))
             self.connection.commit()
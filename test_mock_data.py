@@ -0,0 +1,252 @@
+# ============================================================================
+# TESTS DE LA CONEXIÓN SIMULADA (mock_data.py)
+# ============================================================================
+
+import logging
+
+import pytest
+
+from mock_data import (
+    MockConnection, SEED_USERS,
+    acquire_mock_connection, release_mock_connection
+)
+
+log = logging.getLogger("tests")
+
+_INSERT = "INSERT INTO users (cedula, nombre) VALUES (%s, %s)"
+_SELECT_ALL = "SELECT * FROM users"
+_SELECT_ONE = "SELECT * FROM users WHERE cedula = %s"
+_UPDATE = "UPDATE users SET nombre = %s WHERE cedula = %s"
+_DELETE = "DELETE FROM users WHERE cedula = %s"
+
+
+@pytest.fixture
+def connection():
+    """Conexión simulada con los usuarios iniciales"""
+    return MockConnection()
+
+
+@pytest.fixture
+def pooled_connection():
+    """Conexión del pool; al terminar se reinicia y vuelve al pool"""
+    connection = acquire_mock_connection()
+    
+    yield connection
+    
+    release_mock_connection(connection)
+
+
+def test_select_all_returns_seed_users(connection):
+    """SELECT sin filtro devuelve los usuarios iniciales"""
+    cursor = connection.cursor(dictionary=True)
+    cursor.execute(_SELECT_ALL)
+    
+    assert [u['cedula'] for u in cursor.fetchall()] == [
+        u['cedula'] for u in SEED_USERS
+    ]
+    
+    log.debug("✅ SELECT devuelve los usuarios iniciales")
+
+
+def test_fetchall_returns_snapshot(connection):
+    """fetchall no expone la lista interna de la conexión"""
+    cursor = connection.cursor(dictionary=True)
+    cursor.execute(_SELECT_ALL)
+    usuarios = cursor.fetchall()
+    
+    # Borrar mientras se recorre no salta filas
+    for usuario in usuarios:
+        cursor.execute(_DELETE, (usuario['cedula'],))
+    cursor.execute(_SELECT_ALL)
+    assert cursor.fetchall() == []
+    
+    # Un resultado anterior no crece con inserciones posteriores
+    assert len(usuarios) == len(SEED_USERS)
+    cursor.execute(_INSERT, ('555', 'Nuevo'))
+    assert len(usuarios) == len(SEED_USERS)
+    
+    log.debug("✅ fetchall devuelve una instantánea")
+
+
+@pytest.mark.parametrize("cedula,expected", [
+    (SEED_USERS[0]['cedula'], [SEED_USERS[0]]),
+    ('no-existe', []),
+])
+def test_fetchall_after_filtered_select(connection, cedula, expected):
+    """fetchall tras un SELECT filtrado devuelve una lista de filas"""
+    cursor = connection.cursor(dictionary=True)
+    cursor.execute(_SELECT_ONE, (cedula,))
+    
+    assert cursor.fetchall() == expected
+    
+    log.debug("✅ fetchall con filtro devuelve filas")
+
+
+def test_fetchone_after_select_all_is_snapshot(connection):
+    """fetchone tras SELECT sin filtro no expone el almacenamiento"""
+    cursor = connection.cursor(dictionary=True)
+    cursor.execute(_SELECT_ALL)
+    
+    cursor.fetchone().clear()
+    assert len(connection.data) == len(SEED_USERS)
+    
+    log.debug("✅ fetchone devuelve una instantánea")
+
+
+def test_insert_select_update_delete(connection):
+    """CRUD completo sobre la conexión simulada"""
+    cursor = connection.cursor()
+    
+    cursor.execute(_INSERT, ('555', 'Ana'))
+    assert cursor.rowcount == 1
+    assert cursor.lastrowid == len(SEED_USERS) + 1
+    
+    cursor.execute(_SELECT_ONE, ('555',))
+    assert cursor.fetchone()['nombre'] == 'Ana'
+    
+    cursor.execute(_UPDATE, ('Ana María', '555'))
+    assert cursor.rowcount == 1
+    cursor.execute(_SELECT_ONE, ('555',))
+    assert cursor.fetchone()['nombre'] == 'Ana María'
+    
+    cursor.execute(_DELETE, ('555',))
+    assert cursor.rowcount == 1
+    cursor.execute(_SELECT_ONE, ('555',))
+    assert cursor.fetchone() is None
+    
+    log.debug("✅ CRUD simulado correcto")
+
+
+@pytest.mark.parametrize("query,params", [
+    (_UPDATE, ('Nadie', 'no-existe')),
+    (_DELETE, ('no-existe',)),
+])
+def test_update_delete_missing_user(connection, query, params):
+    """UPDATE/DELETE sobre una cédula inexistente no afectan filas"""
+    cursor = connection.cursor()
+    cursor.execute(query, params)
+    
+    assert cursor.rowcount == 0
+    assert len(connection.data) == len(SEED_USERS)
+    
+    log.debug("✅ Sin filas afectadas para cédula inexistente")
+
+
+def test_insert_duplicate_cedula_is_rejected(connection):
+    """Cédula UNIQUE: el duplicado no se inserta y el original sigue accesible"""
+    cedula = SEED_USERS[0]['cedula']
+    cursor = connection.cursor()
+    cursor.execute(_INSERT, (cedula, 'Duplicado'))
+    
+    assert cursor.rowcount == 0
+    assert cursor.lastrowid is None
+    assert len(connection.data) == len(SEED_USERS)
+    
+    cursor.execute(_SELECT_ONE, (cedula,))
+    assert cursor.fetchone()['nombre'] == SEED_USERS[0]['nombre']
+    
+    cursor.execute(_DELETE, (cedula,))
+    assert cursor.rowcount == 1
+    assert all(u['cedula'] != cedula for u in connection.data)
+    
+    log.debug("✅ Cédula duplicada rechazada")
+
+
+def test_executemany_accumulates_rowcount(connection):
+    """executemany inserta todas las filas y suma las filas afectadas"""
+    cursor = connection.cursor()
+    cursor.executemany(_INSERT, [('a', 'A'), ('b', 'B'), ('a', 'Otra A')])
+    
+    # El duplicado de 'a' no cuenta
+    assert cursor.rowcount == 2
+    assert [u['cedula'] for u in connection.data[-2:]] == ['a', 'b']
+    
+    log.debug("✅ executemany suma rowcount")
+
+
+def test_cursors_share_connection_sequence(connection):
+    """Los ids salen de la conexión, no de cada cursor"""
+    first, second = connection.cursor(), connection.cursor()
+    first.execute(_INSERT, ('a', 'A'))
+    second.execute(_INSERT, ('b', 'B'))
+    
+    assert (first.lastrowid, second.lastrowid) == (
+        len(SEED_USERS) + 1, len(SEED_USERS) + 2
+    )
+    
+    log.debug("✅ Secuencia de ids compartida entre cursores")
+
+
+def test_pool_reuses_reset_connection(pooled_connection):
+    """Una conexión devuelta al pool vuelve con los datos iniciales"""
+    cursor = pooled_connection.cursor()
+    cursor.execute(_INSERT, ('a', 'A'))
+    cursor.execute(_DELETE, (SEED_USERS[0]['cedula'],))
+    
+    release_mock_connection(pooled_connection)
+    reused = acquire_mock_connection()
+    assert reused is pooled_connection
+    assert reused.data == list(SEED_USERS)
+    assert set(reused.by_cedula) == {u['cedula'] for u in SEED_USERS}
+    
+    # Un cursor abierto antes del reinicio sigue siendo válido
+    cursor.execute(_INSERT, ('b', 'B'))
+    assert cursor.lastrowid == len(SEED_USERS) + 1
+    
+    log.debug("✅ Pool reutiliza conexiones reiniciadas")
+
+
+# ============================================================================
+# UserModel sobre la conexión simulada (requiere mysql-connector)
+# ============================================================================
+
+@pytest.fixture
+def user_model(connection):
+    """UserModel con cursores persistentes sobre la conexión simulada"""
+    pytest.importorskip("mysql.connector")
+    from models import UserModel
+    return UserModel(connection)
+
+
+def test_user_model_crud(user_model):
+    """crear/buscar/actualizar/eliminar con los cursores persistentes"""
+    assert user_model.crear('555', 'Ana') == len(SEED_USERS) + 1
+    assert user_model.crear('555', 'Otra') is None  # cédula duplicada
+    
+    assert user_model.buscar_por_cedula('555')['nombre'] == 'Ana'
+    assert user_model.actualizar('555', 'Ana María')
+    assert not user_model.actualizar('no-existe', 'Nadie')
+    
+    assert user_model.eliminar('555')
+    assert not user_model.eliminar('555')
+    assert user_model.buscar_por_cedula('555') is None
+    
+    log.debug("✅ UserModel CRUD correcto")
+
+
+def test_user_model_crear_muchos(user_model):
+    """crear_muchos inserta el lote con un único executemany"""
+    assert user_model.crear_muchos([('a', 'A'), ('b', 'B')]) == 2
+    
+    usuarios = user_model.listar_todos()
+    assert [u['cedula'] for u in usuarios[-2:]] == ['a', 'b']
+    
+    # Eliminar mientras se recorre el listado no deja filas atrás
+    for usuario in usuarios:
+        user_model.eliminar(usuario['cedula'])
+    assert user_model.listar_todos() == []
+    
+    log.debug("✅ crear_muchos inserta el lote")
+
+
+def test_user_model_ids_restart_after_reset(pooled_connection):
+    """Un UserModel vivo vuelve a emitir ids desde el inicio tras reset()"""
+    pytest.importorskip("mysql.connector")
+    from models import UserModel
+    user_model = UserModel(pooled_connection)
+    
+    assert user_model.crear('555', 'Ana') == len(SEED_USERS) + 1
+    pooled_connection.reset()
+    assert user_model.crear('555', 'Ana') == len(SEED_USERS) + 1
+    
+    log.debug("✅ Ids reiniciados tras reset()")